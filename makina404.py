@@ -1,10 +1,19 @@
 import asyncio
-import subprocess
 import httpx
+import httpcore
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
 from playwright.async_api import async_playwright, Error as PlaywrightError
 import aiohttp
+import ipaddress
+import json
 import os
+import re
 import sys
+import time
+import uuid
+from collections import deque
 from urllib.parse import urlparse
 
 try:
@@ -14,143 +23,623 @@ try:
 except ImportError:
     print("[*] python-dotenv not installed, relying on system environment variables.")
 
+try:
+    import uvloop # Faster drop-in event loop, not available on Windows
+except ImportError:
+    uvloop = None
+
 # --- Configuration ---
 INPUT_FILE = "domains.txt"
 DISCORD_WEBHOOK_URL = os.getenv('DISCORD_SCANNER_WEBHOOK')
-# Path to rapiddns executable if not in PATH, otherwise leave as 'rapiddns'
-RAPIDDNS_PATH = 'rapiddns'
+# Optional CDP endpoint of an already running Chromium (e.g. http://localhost:9222) shared between scanner instances
+BROWSER_CDP_URL = os.getenv('MAKINA404_CDP_URL')
+# Certificate transparency search used for subdomain enumeration
+CRTSH_URL = "https://crt.sh/?q=%25.{domain}&output=json"
+# crt.sh can be slow for large domains (seconds)
+CRTSH_TIMEOUT = 60
+# Limit concurrent crt.sh queries (one per target domain)
+ENUM_CONCURRENCY = 20
+# Limit concurrent DNS lookups when resolving enumerated subdomains
+DNS_CONCURRENCY = 500
+# How long a name that returned NXDOMAIN is treated as dead (seconds)
+DNS_NEGATIVE_TTL = 60
 # Limit concurrent browser operations (screenshots)
 SCREENSHOT_CONCURRENCY = 5
 # Limit concurrent subdomain checks (HTTP requests)
 HTTPX_CONCURRENCY = 100
+# Max enumerated subdomains waiting for a check worker, enumeration pauses when it is full
+SUBDOMAIN_QUEUE_SIZE = 1000
+# Lowest HTTP concurrency the admission controller backs off to on timeouts/rate limits
+HTTPX_MIN_CONCURRENCY = 10
+# Number of recent HTTP outcomes the admission controller looks at
+HTTPX_WINDOW = 100
+# Share of timeouts/rate limits in the window above which the admission controller lowers the limit
+# (it raises the limit again once the share drops below half of this)
+HTTPX_BACKOFF_RATE = 0.2
+# Outcomes between two adjustments of the limit, each adjustment moves it by one
+HTTPX_ADJUST_EVERY = 10
 # User-Agent for requests
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36 SubdomainScanner/1.0"
 # HTTPX request timeout (seconds)
 HTTP_TIMEOUT = 10
 # Playwright navigation timeout (milliseconds)
 BROWSER_TIMEOUT = 15000 # 15 seconds
-
-# --- Global Semaphore for Browser Operations ---
-browser_semaphore = asyncio.Semaphore(SCREENSHOT_CONCURRENCY)
-httpx_semaphore = asyncio.Semaphore(HTTPX_CONCURRENCY)
+# Body signatures of unclaimed resources on common hosting providers, a match confirms the 404 without a screenshot
+PROVIDER_SIGNATURES = {
+    'NoSuchBucket': 'AWS S3',
+    'The specified bucket does not exist': 'AWS S3',
+    'herokucdn.com/error-pages/no-such-app.html': 'Heroku',
+    "There isn't a GitHub Pages site here.": 'GitHub Pages',
+    '404 Web Site not found': 'Azure',
+    'Sorry, this shop is currently unavailable.': 'Shopify',
+    'Fastly error: unknown domain': 'Fastly',
+    "The thing you were looking for is no longer here, or never was": 'Ghost',
+}
+# Chromium flags that keep the launched browser lean
+BROWSER_ARGS = [
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-features=TranslateUI,BlinkGenPropertyTrees',
+]
+# Disable the Chromium sandbox, only for containers where it can't start (e.g. running as root)
+# Takeover candidates serve pages a third party may control, so keep the sandbox whenever possible
+BROWSER_NO_SANDBOX = False
+# Browser viewport used for screenshots
+SCREENSHOT_VIEWPORT = {'width': 1024, 'height': 768}
+# Directory screenshots are saved to
+SCREENSHOT_DIR = "screenshots"
+# Attach screenshots to Discord notifications, set to False to only send URLs and the local screenshot path
+DISCORD_UPLOAD_SCREENSHOTS = True
+# JPEG quality for screenshots (0-100)
+SCREENSHOT_QUALITY = 70
+# Resource types the browser doesn't fetch, the page structure is enough to spot a takeover
+BLOCKED_RESOURCE_TYPES = ("image", "stylesheet", "font", "media")
+# Discord allows up to 10 attachments per message
+DISCORD_BATCH_SIZE = 10
+# Discord rejects messages with more characters than this
+DISCORD_MAX_CONTENT = 2000
+# Max time to wait for a Discord batch to fill up before sending it (seconds)
+DISCORD_BATCH_WAIT = 2
+# Max retries for a Discord message when rate limited (HTTP 429)
+DISCORD_MAX_RETRIES = 5
+
+# URL schemes tried for each subdomain, in order
+URL_PREFIXES = ("https://", "http://")
+# Matches hostnames with at least two labels of 1-63 letters, digits or inner hyphens
+valid_hostname = re.compile(r'^(?!-)[A-Za-z0-9-]{1,63}(?<!-)(\.(?!-)[A-Za-z0-9-]{1,63}(?<!-))+$').match
+
+# --- Admission Control ---
+
+class AdmissionController:
+    """Limits concurrent HTTP checks, with a limit that adapts to how upstreams are coping.
+
+    Unlike asyncio.Semaphore, the limit can be changed while tasks are waiting.
+    """
+
+    def __init__(self, max_in_flight: int, min_in_flight: int, window: int, backoff_rate: float, adjust_every: int):
+        self.in_flight = 0
+        self.max_in_flight = max_in_flight
+        self.ceiling = max_in_flight
+        self.floor = min_in_flight
+        self.backoff_rate = backoff_rate
+        self.adjust_every = adjust_every
+        # Recent outcomes, True for a timeout or rate limit
+        self.outcomes = deque(maxlen=window)
+        self.since_adjust = 0
+        self.cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.in_flight < self.max_in_flight)
+            self.in_flight += 1
+
+    async def release(self):
+        async with self.cond:
+            self.in_flight -= 1
+            self.cond.notify(1)
+
+    async def record_failure(self):
+        """Records a timeout or rate limit."""
+        await self._record(True)
+
+    async def record_success(self):
+        """Records an answered request."""
+        await self._record(False)
+
+    async def _record(self, failed: bool):
+        async with self.cond:
+            self.outcomes.append(failed)
+            self.since_adjust += 1
+            # Wait for a full window and space adjustments out, so one burst only moves the limit a little
+            if len(self.outcomes) < self.outcomes.maxlen or self.since_adjust < self.adjust_every:
+                return
+            self.since_adjust = 0
+            failure_rate = sum(self.outcomes) / len(self.outcomes)
+            if failure_rate > self.backoff_rate and self.max_in_flight > self.floor:
+                self.max_in_flight -= 1
+            elif failure_rate < self.backoff_rate / 2 and self.max_in_flight < self.ceiling:
+                self.max_in_flight += 1
+                self.cond.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+# --- Cached DNS for HTTP Checks ---
+
+class CachedDNSBackend(httpcore.AsyncNetworkBackend):
+    """httpcore network backend that connects to addresses from the shared DNS cache.
+
+    Subdomains are resolved once by the pre-filter, so the HTTPS and HTTP attempts
+    (and any redirects) reuse those answers instead of resolving again.
+    """
+
+    def __init__(self):
+        self.backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        # One deadline for the whole connect, however many addresses it takes
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            if known_nxdomain(host):
+                raise httpcore.ConnectError(f"{host} does not exist (cached NXDOMAIN)")
+            addresses = await resolve_a(host)
+            if addresses:
+                # TLS still uses the hostname for SNI, only the TCP connection goes to the address
+                # Try the addresses in turn so a single dead A record doesn't fail the host,
+                # each attempt gets an equal share of what is left of the timeout
+                last_error = None
+                for i, address in enumerate(addresses):
+                    attempt_timeout = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise httpcore.ConnectTimeout(f"Timed out connecting to {host}")
+                        attempt_timeout = remaining / (len(addresses) - i)
+                    try:
+                        return await self.backend.connect_tcp(address, port, timeout=attempt_timeout, local_address=local_address, socket_options=socket_options)
+                    except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                        last_error = e
+                raise last_error
+            # No A record (e.g. IPv6 only), let the system resolver have a go
+        if deadline is not None:
+            timeout = max(deadline - time.monotonic(), 0)
+        return await self.backend.connect_tcp(host, port, timeout=timeout, local_address=local_address, socket_options=socket_options)
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self.backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds):
+        await self.backend.sleep(seconds)
+
+
+def make_http_transport() -> httpx.AsyncHTTPTransport:
+    """Creates the transport used for all HTTP checks."""
+    transport = httpx.AsyncHTTPTransport(verify=False, http2=True, limits=httpx.Limits(max_connections=2 * HTTPX_CONCURRENCY, max_keepalive_connections=2 * HTTPX_CONCURRENCY)) # Disable SSL verify for flexibility
+    # httpx has no public option for the network backend, swap it on the underlying httpcore pool
+    # (private attribute, checked against httpx 0.28.1 / httpcore 1.0.9)
+    transport._pool._network_backend = CachedDNSBackend()
+    return transport
+
+# --- Global Semaphores and Resolver ---
+httpx_admission = AdmissionController(HTTPX_CONCURRENCY, HTTPX_MIN_CONCURRENCY, HTTPX_WINDOW, HTTPX_BACKOFF_RATE, HTTPX_ADJUST_EVERY)
+enum_semaphore = asyncio.Semaphore(ENUM_CONCURRENCY)
+dns_semaphore = asyncio.Semaphore(DNS_CONCURRENCY)
+dns_resolver = dns.asyncresolver.Resolver()
+# Subdomains already handed to resolution/checks, so overlapping targets don't probe them twice
+seen_subdomains: set[str] = set()
+# A records of resolved names with their expiry time and canonical name, shared by the DNS pre-filter and the HTTP checks
+# (the canonical name is the end of the CNAME chain, the name itself when there is no CNAME)
+dns_cache: dict[str, tuple[frozenset[str], float, str]] = {}
+# Names that returned NXDOMAIN with their expiry time, shared across targets
+dns_negative_cache: dict[str, float] = {}
+# Per-zone lookup of a random label, tells which names are only answered by a wildcard record
+wildcard_lookups: dict[str, asyncio.Task] = {}
+# Status of the first check of each (zone, wildcard CNAME target) endpoint, None if it couldn't be checked
+wildcard_status: dict[tuple[str, str], int | None] = {}
+# Siblings parked while the first check of their wildcard endpoint is running
+wildcard_waiting: dict[tuple[str, str], list[str]] = {}
+# Enumerated (subdomain, addresses) waiting to be checked, None tells a check worker to stop
+subdomain_queue = asyncio.Queue(maxsize=SUBDOMAIN_QUEUE_SIZE)
+# Pending (url, screenshot path, screenshot bytes to upload, provider) notifications, None tells the notifier to stop
+discord_queue = asyncio.Queue()
+# Screenshot/notification tasks still running, so main can wait for them before shutting down
+takeover_tasks: set[asyncio.Task] = set()
 
 # --- Helper Functions ---
 
-async def run_rapiddns(domain: str) -> list[str]:
-    """Runs the rapiddns tool asynchronously to get subdomains."""
-    subdomains = set()
-    command = [RAPIDDNS_PATH, "-s", domain]
-    print(f"[*] Enumerating subdomains for: {domain}")
+async def fetch_crtsh(domain: str, client: httpx.AsyncClient) -> set[str]:
+    """Collects candidate subdomains for a domain from crt.sh certificate transparency logs."""
+    candidates = set()
     try:
-        process = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-
-        if process.returncode != 0:
-            print(f"[!] Error running rapiddns for {domain}: {stderr.decode(errors='ignore').strip()}", file=sys.stderr)
-            return []
-
-        output = stdout.decode(errors='ignore').strip()
-        if output:
-            # rapiddns output is one subdomain per line
-            found = output.splitlines()
-            subdomains.update(sub.strip() for sub in found if sub.strip())
-            print(f"[*] Found {len(found)} potential subdomains for {domain}")
-        else:
-            print(f"[*] No subdomains found by rapiddns for {domain}")
+        async with enum_semaphore: # Limit concurrent crt.sh queries
+            response = await client.get(CRTSH_URL.format(domain=domain), timeout=CRTSH_TIMEOUT)
+        if response.status_code != 200:
+            print(f"[!] crt.sh returned status {response.status_code} for {domain}", file=sys.stderr)
+            return candidates
+        for entry in response.json():
+            # name_value holds one or more names separated by newlines, possibly wildcards
+            for name in entry.get('name_value', '').splitlines():
+                name = name.strip().lower().removeprefix('*.')
+                if name == domain or name.endswith('.' + domain):
+                    candidates.add(name)
+    except httpx.HTTPError as e:
+        print(f"[!] Error querying crt.sh for {domain}: {type(e).__name__} - {e}", file=sys.stderr)
+    except ValueError as e: # Invalid JSON, crt.sh sometimes answers with an HTML error page
+        print(f"[!] Invalid crt.sh response for {domain}: {e}", file=sys.stderr)
+    return candidates
+
+
+def known_nxdomain(name: str) -> bool:
+    """Returns True if the name, or any parent of it, is already known not to exist."""
+    now = time.time()
+    labels = name.split('.')
+    return any(dns_negative_cache.get('.'.join(labels[i:]), 0) > now for i in range(len(labels)))
+
+
+async def resolve_a(name: str) -> frozenset[str]:
+    """Returns the A records of a name, empty if it has none."""
+    cached = dns_cache.get(name)
+    if cached and cached[1] > time.time():
+        return cached[0]
+    async with dns_semaphore: # Limit concurrent DNS lookups
+        # Checked after waiting for a slot, other lookups may have found a dead parent meanwhile
+        if known_nxdomain(name):
+            return frozenset()
+        try:
+            answer = await dns_resolver.resolve(name, 'A')
+            addresses = frozenset(rdata.address for rdata in answer)
+            # Keep the answer for as long as its TTL allows
+            canonical = answer.canonical_name.to_text(omit_final_dot=True).lower()
+            dns_cache[name] = (addresses, answer.expiration, canonical)
+            return addresses
+        except dns.resolver.NXDOMAIN as e:
+            # Nothing exists at or below the name that doesn't exist, remember it for other candidates and targets.
+            # For a CNAME to a missing target that is the target, the queried name itself does exist (RFC 8020)
+            try:
+                missing = e.canonical_name.to_text(omit_final_dot=True).lower()
+            except TypeError: # Exception raised without the query details
+                missing = None
+            if missing:
+                dns_negative_cache[missing] = time.time() + DNS_NEGATIVE_TTL
+            return frozenset()
+        except dns.exception.DNSException: # No answer, timeouts...
+            return frozenset()
+
+
+async def resolve_batch(names: list[str]):
+    """Resolves names concurrently, yielding (name, addresses) for each one with at least one A record as soon as its lookup finishes."""
+    async def lookup(name: str) -> tuple[str, frozenset[str]]:
+        return name, await resolve_a(name)
+
+    remaining = iter(names)
+    pending = set()
+    while True:
+        # Keep at most DNS_CONCURRENCY lookups in flight rather than creating a task per name up front
+        for name in remaining:
+            pending.add(asyncio.create_task(lookup(name)))
+            if len(pending) >= DNS_CONCURRENCY:
+                break
+        if not pending:
+            return
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            name, addresses = task.result()
+            if addresses:
+                yield name, addresses
+
+
+def canonical_name(name: str) -> str | None:
+    """Returns the cached canonical name of a resolved name, None if it isn't cached."""
+    cached = dns_cache.get(name)
+    return cached[2] if cached else None
+
+
+async def lookup_wildcard(zone: str) -> tuple[frozenset[str], str | None]:
+    """Resolves a random label under the zone, returns its A records and the CNAME target answering it."""
+    probe = f"{uuid.uuid4().hex}.{zone}"
+    addresses = await resolve_a(probe)
+    target = canonical_name(probe)
+    # A wildcard A record answers with the probe's own name, which no real name can match
+    return addresses, (target if target != probe else None)
+
+
+async def wildcard_endpoint(sub: str, addresses: frozenset[str]) -> tuple[str, str] | None:
+    """Returns the (zone, CNAME target) key if the name is answered by its zone's wildcard CNAME, None otherwise.
+
+    Only names that follow the same CNAME as a random label are collapsed: names with their own records
+    on shared IPs (CDNs, host-routed load balancers) are where a dangling vhost answers 404.
+    """
+    zone = sub.partition('.')[2]
+    if zone not in wildcard_lookups:
+        # Shared task so concurrent siblings only probe the zone once
+        wildcard_lookups[zone] = asyncio.create_task(lookup_wildcard(zone))
+    wildcard_addresses, wildcard_target = await wildcard_lookups[zone]
+    if wildcard_target and canonical_name(sub) == wildcard_target and addresses == wildcard_addresses:
+        return zone, wildcard_target
+    return None
+
+
+async def enum_subdomains(domain: str, client: httpx.AsyncClient):
+    """Enumerates subdomains from certificate transparency logs, yielding (subdomain, addresses) for the ones that resolve."""
+    print(f"[*] Enumerating subdomains for: {domain}")
+    found = await fetch_crtsh(domain, client)
+    if not found:
+        print(f"[*] No subdomains found in certificate transparency logs for {domain}")
+        return
+    # Skip names already found for another target
+    candidates = sorted(found - seen_subdomains)
+    seen_subdomains.update(candidates)
+    if len(candidates) < len(found):
+        print(f"[*] Skipping {len(found) - len(candidates)} subdomains of {domain} already found for other targets")
+
+    # Drop names without an A record before they cost a TCP/TLS attempt
+    resolved = 0
+    async for sub, addresses in resolve_batch(candidates):
+        resolved += 1
+        yield sub, addresses
+    print(f"[*] Found {len(candidates)} potential subdomains for {domain}, {resolved} resolve")
+
+
+async def produce_subdomains(domain: str, client: httpx.AsyncClient) -> int:
+    """Feeds subdomains of a domain into subdomain_queue as they are enumerated, returns how many were queued."""
+    queued = 0
+    async for sub, addresses in enum_subdomains(domain, client):
+        # Basic validation - skip if it doesn't look like a valid hostname part
+        if not valid_hostname(sub):
+            # print(f"[*] Skipping invalid subdomain format: {sub}")
+            continue
+        await subdomain_queue.put((sub, addresses))
+        queued += 1
+    return queued
+
+
+def definitive_status(status: int | None) -> bool:
+    """Returns True for statuses that settle a wildcard endpoint (2xx/3xx), rate limits and errors don't."""
+    return status is not None and 200 <= status < 400
+
+
+async def check_worker(client: httpx.AsyncClient, page_pool: asyncio.Queue):
+    """Checks subdomains from subdomain_queue until it receives None."""
+    while True:
+        item = await subdomain_queue.get()
+        try:
+            if item is None:
+                return
+            sub, addresses = item
+            key = await wildcard_endpoint(sub, addresses)
+            if key is None:
+                await check_subdomain(sub, client, page_pool)
+                continue
+            # Names answered by their zone's wildcard CNAME are the same endpoint, probe it once per zone
+            if key in wildcard_status:
+                if not definitive_status(wildcard_status[key]):
+                    await check_subdomain(sub, client, page_pool)
+                # else: print(f"[*] Skipping wildcard endpoint {sub} (status {wildcard_status[key]})")
+                continue
+            if key in wildcard_waiting:
+                # The first check is still running, park the name and free this worker for other zones
+                wildcard_waiting[key].append(sub)
+                continue
+            wildcard_waiting[key] = []
+            try:
+                status = await check_subdomain(sub, client, page_pool)
+            except Exception as e:
+                # Still settle the endpoint below, or the parked siblings would never be checked
+                print(f"[!] Unexpected Error checking {sub}: {type(e).__name__} - {e}", file=sys.stderr)
+                status = None
+            wildcard_status[key] = status
+            siblings = wildcard_waiting.pop(key)
+            if not definitive_status(status):
+                # The endpoint didn't give a clear answer, the parked siblings need their own checks
+                for sibling in siblings:
+                    await check_subdomain(sibling, client, page_pool)
+        except Exception as e:
+            print(f"[!] Unexpected Error in check worker for {item}: {type(e).__name__} - {e}", file=sys.stderr)
+        finally:
+            subdomain_queue.task_done()
 
-    except FileNotFoundError:
-        print(f"[!] Error: '{RAPIDDNS_PATH}' command not found. Make sure rapiddns is installed and in your PATH.", file=sys.stderr)
-        # Exit if rapiddns isn't found, as the script can't proceed
-        sys.exit(1)
-    except Exception as e:
-        print(f"[!] Exception running rapiddns for {domain}: {e}", file=sys.stderr)
+def notification_line(url: str, screenshot_path: str | None, screenshot_bytes: bytes | None, provider: str | None) -> str:
+    """Formats one URL of a Discord notification."""
+    if provider:
+        return f"`{url}` ({provider} signature)"
+    if screenshot_path and not screenshot_bytes:
+        return f"`{url}` (screenshot: `{screenshot_path}`)"
+    return f"`{url}`"
 
-    return list(subdomains)
 
-async def send_to_discord(webhook_url: str, subdomain_url: str, screenshot_bytes: bytes):
-    """Sends a message with a screenshot to the Discord webhook."""
-    if not webhook_url or not screenshot_bytes:
+async def send_to_discord(session: aiohttp.ClientSession, webhook_url: str, batch: list[tuple[str, str | None, bytes | None, str | None]]):
+    """Sends one message with up to DISCORD_BATCH_SIZE URLs (and their screenshots) to the Discord webhook."""
+    if not webhook_url or not batch:
         return
 
+    content = "Potential Subdomain Takeover Detected (404):\n" + "\n".join(notification_line(*item) for item in batch)
+    if len(content) > DISCORD_MAX_CONTENT:
+        if len(batch) > 1:
+            # Discord rejects the whole message when it is too long, send it as two smaller ones instead
+            half = len(batch) // 2
+            await send_to_discord(session, webhook_url, batch[:half])
+            await send_to_discord(session, webhook_url, batch[half:])
+            return
+        content = content[:DISCORD_MAX_CONTENT - 3] + "..."
+
+    urls = [url for url, _, _, _ in batch]
+    screenshots = [(screenshot_path, screenshot_bytes) for _, screenshot_path, screenshot_bytes, _ in batch if screenshot_bytes]
     try:
-        # Use aiohttp for multipart/form-data upload needed by Discord webhooks
-        async with aiohttp.ClientSession() as session:
+        for attempt in range(DISCORD_MAX_RETRIES + 1):
+            # Use aiohttp for multipart/form-data upload needed by Discord webhooks
+            # A FormData can only be sent once, so it is rebuilt for every attempt
             form = aiohttp.FormData()
-            form.add_field('payload_json', f'{{"content": "Potential Subdomain Takeover Detected (404): `{subdomain_url}`"}}')
-            # Discord expects the file field to be named 'file', 'file1', etc.
-            form.add_field('file1', screenshot_bytes, filename='screenshot.png', content_type='image/png')
+            form.add_field('payload_json', json.dumps({"content": content}))
+            for i, (screenshot_path, screenshot_bytes) in enumerate(screenshots, start=1):
+                # Discord expects the file fields to be named 'file1', 'file2', etc.
+                # Batches mix provider matches and screenshots, so the file name tells which URL each image shows
+                form.add_field(f'file{i}', screenshot_bytes, filename=os.path.basename(screenshot_path), content_type='image/jpeg')
 
             async with session.post(webhook_url, data=form) as response:
                 if 200 <= response.status < 300:
-                    print(f"[+] Successfully sent notification for {subdomain_url} to Discord.")
-                else:
-                    response_text = await response.text()
-                    print(f"[!] Failed to send notification for {subdomain_url} to Discord. Status: {response.status}, Response: {response_text}", file=sys.stderr)
+                    print(f"[+] Successfully sent notification for {len(urls)} URL(s) to Discord.")
+                    return
+                if response.status == 429 and attempt < DISCORD_MAX_RETRIES:
+                    retry_after = float(response.headers.get('Retry-After', 1))
+                    print(f"[*] Discord rate limit hit, retrying in {retry_after}s")
+                    await asyncio.sleep(retry_after)
+                    continue
+                response_text = await response.text()
+                print(f"[!] Failed to send notification for {', '.join(urls)} to Discord. Status: {response.status}, Response: {response_text}", file=sys.stderr)
+                return
     except aiohttp.ClientError as e:
-        print(f"[!] aiohttp Error sending Discord notification for {subdomain_url}: {e}", file=sys.stderr)
+        print(f"[!] aiohttp Error sending Discord notification for {', '.join(urls)}: {e}", file=sys.stderr)
+    except Exception as e:
+        print(f"[!] Unexpected Error sending Discord notification for {', '.join(urls)}: {e}", file=sys.stderr)
+
+
+async def discord_notifier(session: aiohttp.ClientSession, webhook_url: str):
+    """Drains discord_queue, sending up to DISCORD_BATCH_SIZE URLs per message."""
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        item = await discord_queue.get()
+        if item is None:
+            break
+        batch = [item]
+        # Keep collecting until the batch is full or DISCORD_BATCH_WAIT has passed
+        deadline = loop.time() + DISCORD_BATCH_WAIT
+        while len(batch) < DISCORD_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(discord_queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+        await send_to_discord(session, webhook_url, batch)
+
+
+async def block_heavy_resources(route):
+    """Playwright route handler that aborts requests for BLOCKED_RESOURCE_TYPES."""
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def take_screenshot(page_pool: asyncio.Queue, url: str) -> tuple[str, bytes] | None:
+    """Takes a screenshot of a given URL using a warm page from the pool, returns the path it was saved to and the image."""
+    screenshot = None
+    # The pool holds SCREENSHOT_CONCURRENCY pages, so waiting on it limits concurrent screenshots
+    page = await page_pool.get()
+    print(f"[*] Attempting screenshot for {url} (page acquired)")
+    healthy = False
+    try:
+        await page.goto(url, timeout=BROWSER_TIMEOUT, wait_until='domcontentloaded') # Wait until DOM is loaded
+        # Wait a tiny bit for any dynamic rendering if needed, adjust if necessary
+        # await asyncio.sleep(0.5)
+        # Playwright saves the file and also returns the image, so uploading it needs no read back from disk
+        path = os.path.join(SCREENSHOT_DIR, url.replace('://', '_') + '.jpg')
+        screenshot_bytes = await page.screenshot(path=path, type='jpeg', quality=SCREENSHOT_QUALITY, full_page=False) # Capture viewport
+        screenshot = (path, screenshot_bytes)
+        print(f"[*] Screenshot saved for {url} to {path}")
+        # Reset the page so it is ready for the next screenshot
+        await page.goto("about:blank")
+        healthy = True
+    except PlaywrightError as e:
+        print(f"[!] Playwright Error taking screenshot for {url}: {e}", file=sys.stderr)
+        if "net::ERR_NAME_NOT_RESOLVED" in str(e):
+            print(f"[*] Note: DNS resolution failed for {url} (common)")
+        elif "Timeout" in str(e):
+            print(f"[*] Note: Timeout during navigation/screenshot for {url}")
     except Exception as e:
-        print(f"[!] Unexpected Error sending Discord notification for {subdomain_url}: {e}", file=sys.stderr)
+        print(f"[!] Unexpected Error taking screenshot for {url}: {e}", file=sys.stderr)
+    finally:
+        if not healthy:
+            # Only pay for a new page when the old one may be stuck mid-navigation
+            try:
+                context = page.context
+                if not page.is_closed():
+                    await page.close()
+                page = await context.new_page()
+            except Exception as e:
+                # Keep the slot in the pool anyway, the next screenshot on it fails and tries again
+                print(f"[!] Could not replace browser page after {url}: {e}", file=sys.stderr)
+        # Hand the page back for the next screenshot
+        page_pool.put_nowait(page)
+    return screenshot
+
 
+def match_provider(body: str) -> str | None:
+    """Returns the hosting provider whose unclaimed-resource signature appears in the body, if any."""
+    for signature, provider in PROVIDER_SIGNATURES.items():
+        if signature in body:
+            return provider
+    return None
 
-async def take_screenshot(browser, url: str) -> bytes | None:
-    """Takes a screenshot of a given URL using Playwright."""
-    screenshot_bytes = None
-    # Limit concurrent browser page creation/navigation/screenshotting
-    async with browser_semaphore:
-        print(f"[*] Attempting screenshot for {url} (semaphore acquired)")
-        page = None
+
+async def fetch_provider(client: httpx.AsyncClient, url: str) -> str | None:
+    """Fetches the body of a 404 URL and matches it against PROVIDER_SIGNATURES."""
+    async with httpx_admission: # Limit concurrent httpx requests
         try:
-            context = await browser.new_context(
-                user_agent=USER_AGENT,
-                ignore_https_errors=True, # Important for potentially misconfigured subdomains
-                java_script_enabled=True  # Some 404 pages might need JS
-            )
-            page = await context.new_page()
-            await page.goto(url, timeout=BROWSER_TIMEOUT, wait_until='domcontentloaded') # Wait until DOM is loaded
-            # Wait a tiny bit for any dynamic rendering if needed, adjust if necessary
-            # await asyncio.sleep(0.5)
-            screenshot_bytes = await page.screenshot(type='png', full_page=False) # Capture viewport
-            print(f"[*] Screenshot captured for {url}")
-            await page.close()
-            await context.close() # Close context to free up resources
-        except PlaywrightError as e:
-            print(f"[!] Playwright Error taking screenshot for {url}: {e}", file=sys.stderr)
-            if "net::ERR_NAME_NOT_RESOLVED" in str(e):
-                print(f"[*] Note: DNS resolution failed for {url} (common)")
-            elif "Timeout" in str(e):
-                print(f"[*] Note: Timeout during navigation/screenshot for {url}")
-        except Exception as e:
-            print(f"[!] Unexpected Error taking screenshot for {url}: {e}", file=sys.stderr)
-        finally:
-            if page and not page.is_closed():
-                await page.close()
-            # Context is closed within the try block if successful
-            # print(f"[*] Released semaphore for {url}") # Optional debug print
-    return screenshot_bytes
+            response = await client.get(url, timeout=HTTP_TIMEOUT, follow_redirects=True)
+        except httpx.HTTPError as e:
+            print(f"[*] Could not fetch body of {url} for fingerprinting: {type(e).__name__}")
+            # Same outcome accounting as check_subdomain, dead hosts don't count
+            if isinstance(e, httpx.TimeoutException) and not isinstance(e, httpx.ConnectTimeout):
+                await httpx_admission.record_failure()
+            return None
+        if response.status_code == 429: # Upstream is rate limiting us
+            await httpx_admission.record_failure()
+        else:
+            await httpx_admission.record_success()
+    return match_provider(response.text)
+
+
+async def report_takeover(client: httpx.AsyncClient, page_pool: asyncio.Queue, url: str):
+    """Identifies the provider behind a 404 URL, or screenshots it when the body is inconclusive, and queues the Discord notification."""
+    provider = await fetch_provider(client, url)
+    if provider:
+        # A known signature is conclusive, skip the browser
+        print(f"[!] {url} matches the {provider} unclaimed resource signature")
+        discord_queue.put_nowait((url, None, None, provider))
+        return
+    screenshot = await take_screenshot(page_pool, url)
+    if screenshot:
+        screenshot_path, screenshot_bytes = screenshot
+        # Only hold on to the image when it is going to be uploaded, otherwise the path is enough
+        discord_queue.put_nowait((url, screenshot_path, screenshot_bytes if DISCORD_UPLOAD_SCREENSHOTS else None, None))
 
 
-async def check_subdomain(subdomain: str, client: httpx.AsyncClient, browser, webhook_url: str):
-    """Checks HTTP status of a subdomain and triggers screenshot/alert if 404."""
+async def check_subdomain(subdomain: str, client: httpx.AsyncClient, page_pool: asyncio.Queue) -> int | None:
+    """Checks HTTP status of a subdomain and triggers screenshot/alert if 404.
+
+    Returns the status code the subdomain answered with, None if it couldn't be checked.
+    """
     # Try HTTPS first, then HTTP
-    protocols = ['https', 'http']
-    for proto in protocols:
-        url = f"{proto}://{subdomain}"
-        async with httpx_semaphore: # Limit concurrent httpx requests
+    for prefix in URL_PREFIXES:
+        url = prefix + subdomain
+        status = None
+        async with httpx_admission: # Limit concurrent httpx requests
             try:
-                response = await client.get(url, timeout=HTTP_TIMEOUT, follow_redirects=True)
+                # Only the status code matters, so avoid downloading the body where the server allows it
+                response = await client.head(url, timeout=HTTP_TIMEOUT, follow_redirects=True)
+                if response.status_code in (405, 501): # HEAD not allowed/implemented, fall back to GET
+                    response = await client.get(url, timeout=HTTP_TIMEOUT, follow_redirects=True)
                 # print(f"[*] Checked {url} - Status: {response.status_code}") # Debug
-
-                if response.status_code == 404:
-                    print(f"[!] Potential Takeover: {url} responded with 404")
-                    screenshot = await take_screenshot(browser, url)
-                    if screenshot:
-                        await send_to_discord(webhook_url, url, screenshot)
-                    # If HTTPS gave 404, no need to check HTTP
-                    return # Exit function after handling 404
+                status = response.status_code
+                if status == 429: # Upstream is rate limiting us
+                    await httpx_admission.record_failure()
+                else:
+                    await httpx_admission.record_success()
 
                 # Optional: Handle other interesting status codes?
                 # elif response.status_code in [500, 502, 503]:
@@ -158,31 +647,40 @@ async def check_subdomain(subdomain: str, client: httpx.AsyncClient, browser, we
 
             except httpx.HTTPStatusError as e:
                 # This catches non-2xx responses if raise_for_status() were used, but we handle 404 explicitly
-                if e.response.status_code == 404:
-                     print(f"[!] Potential Takeover: {url} responded with 404 (caught via HTTPStatusError)")
-                     screenshot = await take_screenshot(browser, url)
-                     if screenshot:
-                         await send_to_discord(webhook_url, url, screenshot)
-                     return # Exit function after handling 404
-                else:
-                    print(f"[*] HTTP Error for {url}: Status {e.response.status_code}", file=sys.stderr)
+                status = e.response.status_code
+                if status != 404:
+                    print(f"[*] HTTP Error for {url}: Status {status}", file=sys.stderr)
                     # Don't proceed to screenshot on non-404 server errors usually
-            except (httpx.TimeoutException):
-                print(f"[*] Timeout checking {url}")
-            except (httpx.ConnectError, httpx.NetworkError):
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # A host that never accepts the connection (refused or dropped) may still serve the other protocol,
+                # and says nothing about upstream pressure
                 print(f"[*] Connection Error checking {url}")
                 # If HTTPS fails connection, we might still want to try HTTP (handled by loop)
                 continue # Try next protocol (HTTP)
+            except (httpx.TimeoutException):
+                print(f"[*] Timeout checking {url}")
+                await httpx_admission.record_failure()
+            except httpx.NetworkError:
+                print(f"[*] Network Error checking {url}")
             except (httpx.TooManyRedirects):
                  print(f"[*] Too many redirects for {url}")
             except Exception as e:
                 print(f"[!] Unexpected Error checking {url}: {type(e).__name__} - {e}", file=sys.stderr)
-                # If HTTPS had an unexpected error, maybe still try HTTP?
-                continue # Try next protocol (HTTP)
 
-        # If we get here (after potentially checking both http/https without a 404), the subdomain is likely okay or had other issues.
+        # The HTTP slot is released at this point, so slow browser/Discord work doesn't starve other checks
+        if status == 404:
+            print(f"[!] Potential Takeover: {url} responded with 404")
+            task = asyncio.create_task(report_takeover(client, page_pool, url))
+            takeover_tasks.add(task)
+            task.add_done_callback(takeover_tasks.discard)
+            # If HTTPS gave 404, no need to check HTTP
+            return status # Exit function after handling 404
+
+        # If we get here (without a 404), the subdomain is likely okay or had other issues.
+        # The host answered (or failed for a reason other than connecting), so HTTP won't tell us more.
         # A small delay can prevent overwhelming some servers, but slows things down.
         # await asyncio.sleep(0.05) # Optional small delay
+        return status
 
 # --- Main Execution ---
 
@@ -212,33 +710,50 @@ async def main():
     print("-" * 40)
 
 
-    # Setup Playwright and HTTPX Client
+    # Setup Playwright, HTTPX Client and the shared Discord session
     async with async_playwright() as p, \
-               httpx.AsyncClient(verify=False, headers={'User-Agent': USER_AGENT}, timeout=HTTP_TIMEOUT, limits=httpx.Limits(max_connections=HTTPX_CONCURRENCY, max_keepalive_connections=20)) as client: # Disable SSL verify for flexibility
+               httpx.AsyncClient(transport=make_http_transport(), headers={'User-Agent': USER_AGENT}, timeout=HTTP_TIMEOUT) as client, \
+               aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=10, ttl_dns_cache=300)) as discord_session:
 
         browser = None
+        contexts = []
+        notifier = asyncio.create_task(discord_notifier(discord_session, DISCORD_WEBHOOK_URL))
         try:
-            # Launch browser once
-            browser = await p.chromium.launch() # headless=True is default
-            print("[*] Browser launched successfully.")
-
-            all_subdomain_check_tasks = []
-            for domain in target_domains:
-                subdomains = await run_rapiddns(domain)
-                if subdomains:
-                    # Create check tasks for each subdomain found for this domain
-                    for sub in subdomains:
-                        # Basic validation - skip if it doesn't look like a valid hostname part
-                        if not sub or '.' not in sub or sub.startswith('.') or sub.endswith('.'):
-                             # print(f"[*] Skipping invalid subdomain format: {sub}")
-                             continue
-                        task = asyncio.create_task(check_subdomain(sub, client, browser, DISCORD_WEBHOOK_URL))
-                        all_subdomain_check_tasks.append(task)
-
-            # Wait for all subdomain check tasks to complete
-            if all_subdomain_check_tasks:
-                print(f"\n[*] Checking {len(all_subdomain_check_tasks)} total subdomains concurrently...")
-                await asyncio.gather(*all_subdomain_check_tasks)
+            if BROWSER_CDP_URL:
+                # Share an already running browser instead of starting our own
+                browser = await p.chromium.connect_over_cdp(BROWSER_CDP_URL)
+                print(f"[*] Connected to browser at {BROWSER_CDP_URL}.")
+            else:
+                # Launch browser once
+                browser = await p.chromium.launch(args=BROWSER_ARGS + (['--no-sandbox'] if BROWSER_NO_SANDBOX else [])) # headless=True is default
+                print("[*] Browser launched successfully.")
+
+            os.makedirs(SCREENSHOT_DIR, exist_ok=True)
+            # Pre-create one context and a warm page per screenshot slot and reuse them for every screenshot
+            page_pool = asyncio.Queue()
+            for _ in range(SCREENSHOT_CONCURRENCY):
+                context = await browser.new_context(
+                    user_agent=USER_AGENT,
+                    ignore_https_errors=True, # Important for potentially misconfigured subdomains
+                    java_script_enabled=True, # Some 404 pages might need JS
+                    viewport=SCREENSHOT_VIEWPORT
+                )
+                await context.route("**/*", block_heavy_resources)
+                contexts.append(context)
+                page_pool.put_nowait(await context.new_page())
+
+            # Enumerate all targets concurrently while the workers check subdomains as soon as they are queued
+            print("\n[*] Checking subdomains as they are enumerated...")
+            workers = [asyncio.create_task(check_worker(client, page_pool)) for _ in range(HTTPX_CONCURRENCY)]
+            queued = await asyncio.gather(*(produce_subdomains(domain, client) for domain in target_domains))
+            for _ in workers:
+                await subdomain_queue.put(None)
+            await asyncio.gather(*workers)
+            # Checks return as soon as their 404 is found, wait for the screenshots to finish
+            await asyncio.gather(*takeover_tasks)
+
+            if sum(queued):
+                print(f"\n[*] Checked {sum(queued)} total subdomains.")
             else:
                 print("\n[*] No valid subdomains found across all targets to check.")
 
@@ -248,6 +763,11 @@ async def main():
         except Exception as e:
             print(f"[!] An unexpected error occurred during main execution: {e}", file=sys.stderr)
         finally:
+            # Flush any pending notifications before shutting down
+            discord_queue.put_nowait(None)
+            await notifier
+            for context in contexts:
+                await context.close()
             if browser:
                 await browser.close()
                 print("[*] Browser closed.")
@@ -256,9 +776,8 @@ async def main():
 
 
 if __name__ == "__main__":
-    # On Windows, the default event loop policy might cause issues with subprocesses
-    # If you encounter Proactor event loop errors, uncomment the following line:
-    # if sys.platform == "win32":
-    #    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-
-    asyncio.run(main())
+    if uvloop and sys.platform != "win32":
+        print("[*] Using uvloop event loop.")
+        uvloop.run(main())
+    else:
+        asyncio.run(main())